@@ -8,6 +8,32 @@ import numpy as np
 import os
 import glob
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional - fall back to plain NumPy
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# Money-market / cash tickers excluded from all holdings metrics
+CASH_FUNDS = frozenset({'XX', 'MVRXX', 'DGCXX', 'FEDXX'})
+
+# Columns used by the analysis; everything else in Sheet1 is skipped at read time
+# (ETF Market Value and Company_Name are needed by the weight change analysis)
+REQUIRED_COLUMNS = ['Date', 'Bloomberg Name', 'Ticker', 'Position', 'Stock_Price', 'Weight']
+HOLDINGS_COLUMNS = REQUIRED_COLUMNS + ['ETF Market Value', 'Company_Name']
+
+# Column types for the holdings sheet, so numeric columns skip type inference
+HOLDINGS_DTYPES = {
+    'Ticker': 'string',
+    'Bloomberg Name': 'string',
+    'Position': 'float64',
+    'Stock_Price': 'float64',
+    'Weight': 'float64'
+}
+
 
 def load_etf_holdings(etf_name='ARKK', file_path=None):
     """
@@ -44,16 +70,26 @@ def load_etf_holdings(etf_name='ARKK', file_path=None):
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Data file not found: {file_path}")
     
+    # Reuse the Parquet cache if it is newer than the Excel file
+    cache_path = file_path + '.parquet'
+    etf_data = read_parquet_cache(file_path, cache_path)
+    # Invalidate caches written with a different schema
+    if etf_data is not None and all(col in etf_data.columns for col in REQUIRED_COLUMNS):
+        print(f"Loaded {len(etf_data)} records from cache {cache_path}")
+        return etf_data
+    
     # Load data from Excel
     print(f"Loading {etf_name} data from {file_path}...")
-    etf_data = pd.read_excel(file_path, sheet_name='Sheet1')
+    # Callable usecols skips unused columns without failing on absent optional ones
+    read_kwargs = dict(sheet_name='Sheet1', usecols=lambda col: col in HOLDINGS_COLUMNS, dtype=HOLDINGS_DTYPES)
+    with open_excel(file_path) as workbook:
+        etf_data = pd.read_excel(workbook, **read_kwargs)
     
     # Convert Date column to datetime
     etf_data['Date'] = pd.to_datetime(etf_data['Date'])
     
     # Ensure required columns exist
-    required_cols = ['Date', 'Bloomberg Name', 'Ticker', 'Position', 'Stock_Price', 'Weight']
-    missing_cols = [col for col in required_cols if col not in etf_data.columns]
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in etf_data.columns]
     if missing_cols:
         raise ValueError(f"Missing required columns: {missing_cols}")
     
@@ -61,13 +97,69 @@ def load_etf_holdings(etf_name='ARKK', file_path=None):
     if etf_data['Weight'].max() > 1:
         etf_data['Weight'] = etf_data['Weight'] / 100
     
+    # Weights only need ~7 significant digits, so halve their memory traffic
+    # (Position/Stock_Price stay float64: large share counts and prices are exported as-is)
+    etf_data['Weight'] = etf_data['Weight'].astype(np.float32)
+    
+    # Store repeated strings as categoricals so filters and groupbys compare integer codes
+    etf_data['Ticker'] = etf_data['Ticker'].astype('category')
+    etf_data['Bloomberg Name'] = etf_data['Bloomberg Name'].astype('category')
+    
     # Sort by date
-    etf_data = etf_data.sort_values('Date')
+    etf_data = sort_by_date(etf_data)
+    
+    write_parquet_cache(etf_data, cache_path)
     
     print(f"Loaded {len(etf_data)} records from {file_path}")
     return etf_data
 
 
+def open_excel(file_path):
+    """
+    Open an Excel workbook once so any number of sheets can be read from it.
+    
+    Uses the Rust-based calamine reader when available (pandas >= 2.2,
+    needs python-calamine), otherwise openpyxl.
+    
+    Returns:
+    --------
+    pd.ExcelFile
+        Open workbook (use as a context manager to close it)
+    """
+    try:
+        return pd.ExcelFile(file_path, engine='calamine')
+    except ImportError:
+        return pd.ExcelFile(file_path, engine='openpyxl')
+
+
+def read_parquet_cache(file_path, cache_path):
+    """
+    Read a Parquet cache of data parsed from file_path.
+    
+    Returns None if the cache is missing, older than file_path, or
+    unreadable, so the caller falls back to parsing file_path.
+    """
+    if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(file_path):
+        return None
+    
+    try:
+        return pd.read_parquet(cache_path)
+    except (ImportError, OSError, ValueError):
+        # No Parquet engine installed or unreadable cache - reparse the source file
+        return None
+
+
+def write_parquet_cache(data, cache_path):
+    """
+    Save parsed data as Parquet for faster reloads.
+    """
+    try:
+        data.to_parquet(cache_path, compression='zstd')
+    except (ImportError, OSError, ValueError) as e:
+        # Caching is best-effort; the source file stays the source of truth
+        print(f"⚠ Could not write cache {cache_path}: {e}")
+
+
 def load_arkk_holdings(file_path=None):
     """
     Legacy function - loads ARKK holdings data.
@@ -76,6 +168,50 @@ def load_arkk_holdings(file_path=None):
     return load_etf_holdings('ARKK', file_path)
 
 
+def sort_by_date(data):
+    """
+    Sort data by Date (stable), skipping the sort if it is already in order.
+    
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        DataFrame with Date column
+        
+    Returns:
+    --------
+    pd.DataFrame
+        DataFrame sorted by Date
+    """
+    if data['Date'].is_monotonic_increasing:
+        return data
+    return data.sort_values('Date', kind='stable')
+
+
+def get_cash_mask(tickers, cash_funds=CASH_FUNDS):
+    """
+    Flag rows whose ticker is a cash fund.
+    
+    Parameters:
+    -----------
+    tickers : pd.Series
+        Ticker column, either categorical or plain strings
+    cash_funds : collection of str, optional
+        Tickers treated as cash (defaults to CASH_FUNDS)
+        
+    Returns:
+    --------
+    pd.Series
+        Boolean mask aligned with tickers
+    """
+    if not isinstance(tickers.dtype, pd.CategoricalDtype):
+        return tickers.isin(cash_funds)
+    
+    # Look up each category once, then index by code
+    # The trailing False covers code -1 (missing ticker)
+    cash_codes = np.append(tickers.cat.categories.isin(cash_funds), False)
+    return pd.Series(cash_codes[tickers.cat.codes.to_numpy()], index=tickers.index)
+
+
 def filter_data_by_date(data, start_date=None, end_date=None):
     """
     Filter dataframe by date range.
@@ -94,17 +230,18 @@ def filter_data_by_date(data, start_date=None, end_date=None):
     pd.DataFrame
         Filtered DataFrame
     """
-    filtered_data = data.copy()
+    # Combine conditions into one mask; boolean indexing already returns a new frame
+    mask = pd.Series(True, index=data.index)
     
     if start_date is not None:
         start_date = pd.to_datetime(start_date)
-        filtered_data = filtered_data[filtered_data['Date'] >= start_date]
+        mask &= data['Date'] >= start_date
     
     if end_date is not None:
         end_date = pd.to_datetime(end_date)
-        filtered_data = filtered_data[filtered_data['Date'] <= end_date]
+        mask &= data['Date'] <= end_date
     
-    return filtered_data
+    return data.loc[mask]
 
 
 def get_date_range(data):
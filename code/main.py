@@ -6,11 +6,13 @@ import warnings
 import pandas as pd
 import numpy as np
 import os
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 
 # Import modules
-from data_loader import load_etf_holdings, get_date_range
-from metrics import calculate_holdings_hhi, calculate_pnl_for_period
+from data_loader import load_etf_holdings, get_date_range, get_cash_mask, sort_by_date
+from metrics import calculate_daily_hhi_series, find_top_50pct_contributors
 from portfolio_changes import track_portfolio_changes
 from weight_changes import calculate_weight_changes, create_daily_weight_change_summary
 
@@ -22,6 +24,9 @@ warnings.filterwarnings('ignore')
 # ========================
 ETFS_TO_ANALYZE = ['ARKK', 'ARKW', 'ARKQ', 'ARKF', 'ARKG', 'ARKX']  # Analyze all available ETFs in input folder
 
+# Analysis processes (None = one per ETF up to the CPU count, 1 = single process with I/O threads)
+MAX_WORKERS = None
+
 # Analysis period
 ANALYSIS_PERIOD = {
     'start': '2024-04-01',
@@ -45,87 +50,95 @@ def calculate_daily_hhi_and_contributors(etf_data, start_date, end_date):
     - Top_50pct_Profit_Count
     - Top_50pct_Profit_Tickers
     """
+    # Sort by date and index by it so the range filter is a binary-search slice
+    etf_data = sort_by_date(etf_data)
+    etf_data = etf_data.set_axis(pd.DatetimeIndex(etf_data['Date'].to_numpy()))
+    
     # Filter data by date range
-    if start_date:
-        etf_data = etf_data[etf_data['Date'] >= pd.to_datetime(start_date)]
-    if end_date:
-        etf_data = etf_data[etf_data['Date'] <= pd.to_datetime(end_date)]
+    etf_data = etf_data.loc[
+        pd.to_datetime(start_date) if start_date else None:
+        pd.to_datetime(end_date) if end_date else None
+    ]
+    
+    # Flag cash funds once for the whole period
+    etf_data = etf_data.assign(Is_Cash=get_cash_mask(etf_data['Ticker']))
     
-    # Sort by date
-    etf_data = etf_data.sort_values('Date')
-    unique_dates = sorted(etf_data['Date'].unique())
+    # Calculate HHI and holdings count for all dates at once
+    hhi_series = calculate_daily_hhi_series(etf_data)
+    holdings_counts = etf_data[~etf_data['Is_Cash']].groupby('Date').size()
+    
+    # Lay out one row of positions/prices per date, one column per ticker code
+    # (first row per ticker and date, NaN where not held)
+    unique_dates = pd.DatetimeIndex(etf_data['Date'].unique()).sort_values()
+    holdings = etf_data[~etf_data['Is_Cash'] & etf_data['Ticker'].notna()].drop_duplicates(['Date', 'Ticker'])
+    ticker_codes, tickers = pd.factorize(holdings['Ticker'])
+    ticker_names = np.asarray(tickers, dtype=object)
+    date_rows = unique_dates.get_indexer(holdings['Date'])
+    
+    positions = np.full((len(unique_dates), len(tickers)), np.nan)
+    prices = np.full((len(unique_dates), len(tickers)), np.nan)
+    positions[date_rows, ticker_codes] = holdings['Position'].to_numpy(dtype=np.float64)
+    prices[date_rows, ticker_codes] = holdings['Stock_Price'].to_numpy(dtype=np.float64)
     
     results = []
     
     for i, current_date in enumerate(unique_dates):
         if i == 0:
             # First day - no P&L to calculate
-            daily_holdings = etf_data[etf_data['Date'] == current_date]
-            hhi = calculate_holdings_hhi(daily_holdings)
-            holdings_count = len(daily_holdings[~daily_holdings['Ticker'].isin(['XX', 'MVRXX', 'DGCXX', 'FEDXX'])])
-            
-            results.append({
-                'Date': current_date.strftime('%m/%d/%Y'),
-                'HHI': hhi,
-                'Holdings_Count': holdings_count,
-                'Top_50pct_Profit_Count': 0,
-                'Top_50pct_Profit_Tickers': ''
-            })
+            top_50pct_tickers = []
         else:
-            # Calculate HHI
-            daily_holdings = etf_data[etf_data['Date'] == current_date]
-            hhi = calculate_holdings_hhi(daily_holdings)
-            holdings_count = len(daily_holdings[~daily_holdings['Ticker'].isin(['XX', 'MVRXX', 'DGCXX', 'FEDXX'])])
-            
-            # Calculate P&L from previous day
-            prev_date = unique_dates[i-1]
-            prev_holdings = etf_data[etf_data['Date'] == prev_date]
-            
-            pnl_data = calculate_pnl_for_period(prev_holdings, daily_holdings)
-            
-            # Find top 50% profit contributors
-            if pnl_data:
-                # Get only positive P&L stocks
-                positive_pnl = {ticker: data['pnl'] for ticker, data in pnl_data.items() if data['pnl'] > 0}
-                
-                if positive_pnl:
-                    # Sort by P&L
-                    sorted_positive = sorted(positive_pnl.items(), key=lambda x: x[1], reverse=True)
-                    total_positive_pnl = sum(p for _, p in sorted_positive)
-                    
-                    # Find stocks that contribute to 50% of positive P&L
-                    cumulative_pnl = 0
-                    top_50pct_tickers = []
-                    
-                    for ticker, pnl in sorted_positive:
-                        cumulative_pnl += pnl
-                        top_50pct_tickers.append(ticker)
-                        if cumulative_pnl >= total_positive_pnl * 0.5:
-                            break
-                    
-                    top_50pct_count = len(top_50pct_tickers)
-                    top_50pct_names = ', '.join(top_50pct_tickers)
-                else:
-                    top_50pct_count = 0
-                    top_50pct_names = ''
-            else:
-                top_50pct_count = 0
-                top_50pct_names = ''
-            
-            results.append({
-                'Date': current_date.strftime('%m/%d/%Y'),
-                'HHI': hhi,
-                'Holdings_Count': holdings_count,
-                'Top_50pct_Profit_Count': top_50pct_count,
-                'Top_50pct_Profit_Tickers': top_50pct_names
-            })
+            # Find top 50% profit contributors from previous day's P&L
+            top_idx = find_top_50pct_contributors(positions[i-1], prices[i-1], prices[i])
+            top_50pct_tickers = ticker_names[top_idx].tolist()
+        
+        results.append({
+            'Date': current_date.strftime('%m/%d/%Y'),
+            'HHI': hhi_series.loc[current_date],
+            'Holdings_Count': int(holdings_counts.get(current_date, 0)),
+            'Top_50pct_Profit_Count': len(top_50pct_tickers),
+            'Top_50pct_Profit_Tickers': ', '.join(top_50pct_tickers)
+        })
     
     return pd.DataFrame(results)
 
 
-def analyze_etf(etf_name, start_date, end_date):
+def export_analysis(writer, etf_name, sheets):
+    """
+    Write the analysis sheets for one ETF into a shared Excel workbook.
+    Sheets are prefixed with the ETF name (e.g. ARKK_Daily_HHI_Analysis).
+    """
+    # Sheet 1: Daily HHI and Contributors
+    sheets['Daily_HHI_Analysis'].to_excel(writer, sheet_name=f'{etf_name}_Daily_HHI_Analysis', index=False)
+    
+    # Sheet 2: Portfolio Changes
+    if not sheets['Portfolio_Changes'].empty:
+        sheets['Portfolio_Changes'].to_excel(writer, sheet_name=f'{etf_name}_Portfolio_Changes', index=False)
+    else:
+        # Create empty sheet with headers
+        pd.DataFrame(columns=['Date', 'Stocks_Added', 'Stocks_Added_Count', 
+                             'Stocks_Removed', 'Stocks_Removed_Count']).to_excel(
+            writer, sheet_name=f'{etf_name}_Portfolio_Changes', index=False)
+    
+    # Sheet 3: Weight Changes Analysis (dates formatted like the other sheets)
+    weight_changes = sheets['Weight_Changes']
+    if not weight_changes.empty:
+        weight_changes = weight_changes.assign(Date=weight_changes['Date'].dt.strftime('%m/%d/%Y'))
+        weight_changes.to_excel(writer, sheet_name=f'{etf_name}_Weight_Changes', index=False)
+    
+    print(f"✅ Exported {etf_name} sheets")
+
+
+def analyze_etf(etf_name, start_date, end_date, etf_data=None, writer=None):
     """
-    Analyze a single ETF and create Excel output.
+    Analyze a single ETF.
+    
+    etf_data may be a preloaded DataFrame or a Future resolving to one
+    (loaded from the input folder if None). If writer is given, the
+    sheets are also written to it via export_analysis.
+    
+    Returns:
+    --------
+    dict of sheet name -> pd.DataFrame, or None if the data could not be loaded
     """
     print(f"\n{'='*60}")
     print(f"Analyzing {etf_name}")
@@ -133,10 +146,13 @@ def analyze_etf(etf_name, start_date, end_date):
     
     # Load ETF data
     try:
-        etf_data = load_etf_holdings(etf_name)
+        if etf_data is None:
+            etf_data = load_etf_holdings(etf_name)
+        elif isinstance(etf_data, Future):
+            etf_data = etf_data.result()
     except Exception as e:
         print(f"❌ Error loading {etf_name}: {e}")
-        return
+        return None
     
     # Get date range
     data_start, data_end = get_date_range(etf_data)
@@ -156,56 +172,35 @@ def analyze_etf(etf_name, start_date, end_date):
     weight_changes_df = calculate_weight_changes(etf_data, start_date, end_date)
     
     # Create daily changes summary
-    daily_changes = []
-    # Need to match date from changes_summary with formatted date
-    for date_str in daily_analysis['Date'].unique():
-        # Convert string back to datetime for matching (mm/dd/yyyy format)
-        date_parts = date_str.split('/')
-        date_dt = pd.to_datetime(f"{date_parts[2]}-{date_parts[0]}-{date_parts[1]}")
-        date_changes = changes_summary[changes_summary['Date'] == date_dt]
+    daily_changes_df = pd.DataFrame()
+    if not changes_summary.empty:
+        # Group additions/removals by formatted date (mm/dd/yyyy) to match daily_analysis
+        changes = changes_summary[changes_summary['Action'].isin(['Added', 'Removed'])]
+        changes = changes.assign(
+            DateStr=changes['Date'].dt.strftime('%m/%d/%Y'),
+            # Per-element str() so NaN tickers are labelled 'nan' like other tickers
+            Ticker=changes['Ticker'].astype(object).map(str)
+        )
+        by_action = changes.groupby(['DateStr', 'Action'], sort=False)['Ticker']
+        tickers = by_action.agg(', '.join).unstack(fill_value='').reindex(columns=['Added', 'Removed'], fill_value='')
+        counts = by_action.size().unstack(fill_value=0).reindex(columns=['Added', 'Removed'], fill_value=0)
         
-        added = date_changes[date_changes['Action'] == 'Added']['Ticker'].tolist()
-        removed = date_changes[date_changes['Action'] == 'Removed']['Ticker'].tolist()
-        
-        # Convert to strings
-        added = [str(t) for t in added]
-        removed = [str(t) for t in removed]
-        
-        if added or removed:
-            daily_changes.append({
-                'Date': date_str,  # Use the formatted date string
-                'Stocks_Added': ', '.join(added) if added else '',
-                'Stocks_Added_Count': len(added),
-                'Stocks_Removed': ', '.join(removed) if removed else '',
-                'Stocks_Removed_Count': len(removed)
-            })
-    
-    daily_changes_df = pd.DataFrame(daily_changes) if daily_changes else pd.DataFrame()
-    
-    # Export to Excel
-    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
-    os.makedirs(output_dir, exist_ok=True)
-    
-    output_file = os.path.join(output_dir, f'{etf_name}_Analysis_{datetime.now().strftime("%Y%m%d")}.xlsx')
-    
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        # Sheet 1: Daily HHI and Contributors
-        daily_analysis.to_excel(writer, sheet_name='Daily_HHI_Analysis', index=False)
-        
-        # Sheet 2: Portfolio Changes
-        if not daily_changes_df.empty:
-            daily_changes_df.to_excel(writer, sheet_name='Portfolio_Changes', index=False)
-        else:
-            # Create empty sheet with headers
-            pd.DataFrame(columns=['Date', 'Stocks_Added', 'Stocks_Added_Count', 
-                                 'Stocks_Removed', 'Stocks_Removed_Count']).to_excel(
-                writer, sheet_name='Portfolio_Changes', index=False)
-        
-        # Sheet 3: Weight Changes Analysis
-        if not weight_changes_df.empty:
-            weight_changes_df.to_excel(writer, sheet_name='Weight_Changes', index=False)
+        per_date = pd.DataFrame({
+            'Stocks_Added': tickers['Added'],
+            'Stocks_Added_Count': counts['Added'],
+            'Stocks_Removed': tickers['Removed'],
+            'Stocks_Removed_Count': counts['Removed']
+        })
+        daily_changes_df = daily_analysis[['Date']].merge(per_date, left_on='Date', right_index=True, how='inner')
+        daily_changes_df = daily_changes_df.reset_index(drop=True)
     
-    print(f"✅ Exported to: {output_file}")
+    sheets = {
+        'Daily_HHI_Analysis': daily_analysis,
+        'Portfolio_Changes': daily_changes_df,
+        'Weight_Changes': weight_changes_df
+    }
+    if writer is not None:
+        export_analysis(writer, etf_name, sheets)
     
     # Print summary statistics
     print(f"\nSummary Statistics:")
@@ -218,6 +213,63 @@ def analyze_etf(etf_name, start_date, end_date):
     if not daily_changes_df.empty:
         print(f"  Total stocks added: {daily_changes_df['Stocks_Added_Count'].sum()}")
         print(f"  Total stocks removed: {daily_changes_df['Stocks_Removed_Count'].sum()}")
+    
+    return sheets
+
+
+def run_analyses(etf_names, start_date, end_date, output_file, max_workers=None):
+    """
+    Analyze each ETF and write all sheets into one workbook, in ETF order.
+    
+    Parameters:
+    -----------
+    etf_names : list of str
+        ETFs to analyze
+    start_date, end_date : str
+        Analysis period
+    output_file : str
+        Path of the combined Excel workbook
+    max_workers : int, optional
+        Number of analysis processes; defaults to one per ETF up to the CPU
+        count. With 1, ETFs are analyzed in this process while the next one
+        is loaded on an I/O thread.
+    """
+    if max_workers is None:
+        max_workers = min(len(etf_names), os.cpu_count() or 1)
+    
+    # Sheets are written on a single thread (one ETF at a time, in order)
+    # so writing overlaps with the analysis of the following ETFs
+    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer, \
+            ThreadPoolExecutor(max_workers=1) as write_executor:
+        pending_exports = []
+        
+        if max_workers > 1:
+            # ETFs are independent, so analyze them in parallel processes
+            # and hand each result to the writer as it arrives (in ETF order)
+            run_analysis = partial(analyze_etf, start_date=start_date, end_date=end_date)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                for etf_name, sheets in zip(etf_names, executor.map(run_analysis, etf_names)):
+                    if sheets is not None:
+                        pending_exports.append(write_executor.submit(export_analysis, writer, etf_name, sheets))
+        else:
+            # Single process: prefetch the next ETF's Excel file on an I/O thread
+            with ThreadPoolExecutor(max_workers=1) as load_executor:
+                next_load = load_executor.submit(load_etf_holdings, etf_names[0]) if etf_names else None
+                
+                for i, etf_name in enumerate(etf_names):
+                    current_load = next_load
+                    
+                    # Prefetch the next ETF while this one is analyzed
+                    if i + 1 < len(etf_names):
+                        next_load = load_executor.submit(load_etf_holdings, etf_names[i + 1])
+                    
+                    sheets = analyze_etf(etf_name, start_date, end_date, etf_data=current_load)
+                    if sheets is not None:
+                        pending_exports.append(write_executor.submit(export_analysis, writer, etf_name, sheets))
+        
+        # Surface any export errors
+        for export in pending_exports:
+            export.result()
 
 
 def main():
@@ -228,8 +280,15 @@ def main():
     print(f"ETFs to analyze: {', '.join(ETFS_TO_ANALYZE)}")
     print(f"Analysis period: {ANALYSIS_PERIOD['start']} to {ANALYSIS_PERIOD['end']}")
     
-    for etf_name in ETFS_TO_ANALYZE:
-        analyze_etf(etf_name, ANALYSIS_PERIOD['start'], ANALYSIS_PERIOD['end'])
+    # All ETFs go into one workbook
+    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f'All_ETFs_Analysis_{datetime.now().strftime("%Y%m%d")}.xlsx')
+    
+    run_analyses(ETFS_TO_ANALYZE, ANALYSIS_PERIOD['start'], ANALYSIS_PERIOD['end'],
+                 output_file, max_workers=MAX_WORKERS)
+    
+    print(f"\n✅ Exported to: {output_file}")
     
     print("\n" + "="*60)
     print("✅ All analyses complete!")
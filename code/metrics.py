@@ -6,6 +6,8 @@ Handles HHI and contribution calculations.
 import pandas as pd
 import numpy as np
 
+from data_loader import get_cash_mask, njit
+
 
 def calculate_holdings_hhi(holdings_data):
     """
@@ -23,8 +25,7 @@ def calculate_holdings_hhi(holdings_data):
         HHI value
     """
     # Filter out cash funds
-    cash_funds = ['XX', 'MVRXX', 'DGCXX', 'FEDXX']
-    filtered_data = holdings_data[~holdings_data['Ticker'].isin(cash_funds)]
+    filtered_data = holdings_data[~get_cash_mask(holdings_data['Ticker'])]
     
     if len(filtered_data) == 0:
         return 0.0
@@ -33,13 +34,39 @@ def calculate_holdings_hhi(holdings_data):
     # Weight column should already be in decimal format (0.056 for 5.6%)
     weights = filtered_data['Weight'].values
     
-    # Calculate HHI as sum of squared weights
+    # Calculate HHI as sum of squared weights (accumulated in float64)
     # No normalization - use weights as they are
-    hhi = np.sum(weights ** 2)
+    hhi = np.square(weights, dtype=np.float64).sum()
     
     return hhi
 
 
+def calculate_daily_hhi_series(holdings_data):
+    """
+    Calculate HHI for every date at once.
+    HHI = sum of squared weights (as decimals), grouped by Date
+    
+    Parameters:
+    -----------
+    holdings_data : pd.DataFrame
+        Holdings data with Date, Ticker and Weight columns
+        
+    Returns:
+    --------
+    pd.Series
+        HHI values indexed by Date (0.0 for dates with no non-cash holdings)
+    """
+    # Filter out cash funds
+    filtered_data = holdings_data[~get_cash_mask(holdings_data['Ticker'])]
+    
+    # Sum squared weights per date in a single reduction (accumulated in float64)
+    hhi_series = (filtered_data['Weight'].astype(np.float64) ** 2).groupby(filtered_data['Date']).sum()
+    
+    # Dates holding only cash have an HHI of zero
+    all_dates = pd.Index(holdings_data['Date'].unique()).sort_values()
+    return hhi_series.reindex(all_dates, fill_value=0.0)
+
+
 def calculate_portfolio_contributions(returns, weights, pnl_data=None):
     """
     Calculate portfolio contribution metrics based on P&L (NOT HHI).
@@ -50,27 +77,25 @@ def calculate_portfolio_contributions(returns, weights, pnl_data=None):
         Dictionary of stock returns
     weights : dict
         Dictionary of stock weights  
-    pnl_data : dict
-        P&L data for each stock
+    pnl_data : pd.DataFrame
+        P&L data indexed by Ticker, as returned by calculate_pnl_for_period
         
     Returns:
     --------
     dict
         Dictionary with contribution metrics (no HHI here)
     """
-    if not pnl_data or len(pnl_data) == 0:
+    if pnl_data is None or len(pnl_data) == 0:
         return None
     
     # Calculate total P&L
-    total_pnl = sum(stock_data['pnl'] for stock_data in pnl_data.values())
+    total_pnl = pnl_data['pnl'].sum()
     
     if total_pnl == 0:
         return None
     
     # Calculate P&L contributions
-    pnl_contributions = {}
-    for ticker, stock_data in pnl_data.items():
-        pnl_contributions[ticker] = stock_data['pnl'] / abs(total_pnl)
+    pnl_contributions = (pnl_data['pnl'] / abs(total_pnl)).to_dict()
     
     # Sort by absolute contribution
     sorted_contributions = sorted(pnl_contributions.items(), 
@@ -144,42 +169,63 @@ def calculate_pnl_for_period(holdings_start, holdings_end):
         
     Returns:
     --------
-    dict
-        Dictionary with P&L data for each stock
+    pd.DataFrame
+        P&L data indexed by Ticker with columns: pnl, start_price, end_price,
+        start_position, end_position, weight
     """
-    pnl_data = {}
-    
-    # Get unique tickers from both periods
-    all_tickers = set(holdings_start['Ticker'].unique()) | set(holdings_end['Ticker'].unique())
+    cols = ['Ticker', 'Position', 'Stock_Price', 'Weight']
+    
+    def _by_ticker(holdings):
+        # Skip cash funds and keep the first row per ticker
+        holdings = holdings.loc[holdings['Ticker'].notna() & ~get_cash_mask(holdings['Ticker']), cols]
+        return holdings.drop_duplicates('Ticker').set_index('Ticker')
+    
+    # Match tickers held on both dates
+    merged = _by_ticker(holdings_start).join(_by_ticker(holdings_end), lsuffix='_s', rsuffix='_e', how='inner')
+    
+    # Calculate P&L using start position
+    # P&L = (start_position * end_price) - (start_position * start_price)
+    # This is equivalent to: start_position * (end_price - start_price)
+    return pd.DataFrame({
+        'pnl': merged['Position_s'] * (merged['Stock_Price_e'] - merged['Stock_Price_s']),
+        'start_price': merged['Stock_Price_s'],
+        'end_price': merged['Stock_Price_e'],
+        'start_position': merged['Position_s'],
+        'end_position': merged['Position_e'],
+        'weight': merged['Weight_e']
+    }, index=merged.index)
+
+
+@njit(cache=True)
+def find_top_50pct_contributors(prev_position, prev_price, current_price):
+    """
+    Find the stocks that together contribute 50% of positive daily P&L.
     
-    for ticker in all_tickers:
-        # Skip cash funds
-        if isinstance(ticker, str) and ticker in ['XX', 'MVRXX', 'DGCXX', 'FEDXX']:
-            continue
-        
-        start_rows = holdings_start[holdings_start['Ticker'] == ticker]
-        end_rows = holdings_end[holdings_end['Ticker'] == ticker]
+    Parameters:
+    -----------
+    prev_position : np.ndarray
+        Previous day position per ticker (NaN where not held)
+    prev_price : np.ndarray
+        Previous day price per ticker (NaN where not held)
+    current_price : np.ndarray
+        Current day price per ticker (NaN where not held)
         
-        if len(start_rows) > 0 and len(end_rows) > 0:
-            start_row = start_rows.iloc[0]
-            end_row = end_rows.iloc[0]
-            
-            # Calculate P&L using start position
-            # P&L = (start_position * end_price) - (start_position * start_price)
-            # This is equivalent to: start_position * (end_price - start_price)
-            start_position = start_row['Position']
-            start_price = start_row['Stock_Price']
-            end_price = end_row['Stock_Price']
-            
-            pnl = start_position * (end_price - start_price)
-            
-            pnl_data[ticker] = {
-                'pnl': pnl,
-                'start_price': start_price,
-                'end_price': end_price,
-                'start_position': start_position,
-                'end_position': end_row['Position'],
-                'weight': end_row['Weight']
-            }
-    
-    return pnl_data
\ No newline at end of file
+    Returns:
+    --------
+    np.ndarray
+        Ticker indices sorted by P&L (descending), up to the 50% cutoff
+    """
+    # P&L = start_position * (end_price - start_price); NaN unless held on both days
+    pnl = prev_position * (current_price - prev_price)
+    positive = np.nonzero(pnl > 0)[0]
+    
+    if positive.size == 0:
+        return positive
+    
+    # Sort positive P&L descending (stable, so ties keep ticker order)
+    order = positive[np.argsort(-pnl[positive], kind='mergesort')]
+    cumulative_pnl = np.cumsum(pnl[order])
+    
+    # First position where cumulative P&L reaches half of the total
+    cutoff = np.searchsorted(cumulative_pnl, cumulative_pnl[-1] * 0.5) + 1
+    return order[:cutoff]
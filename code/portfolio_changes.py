@@ -8,6 +8,8 @@ import numpy as np
 from datetime import datetime
 import os
 
+from data_loader import get_cash_mask, sort_by_date
+
 
 def track_portfolio_changes(etf_data, start_date=None, end_date=None):
     """
@@ -36,104 +38,65 @@ def track_portfolio_changes(etf_data, start_date=None, end_date=None):
         etf_data = etf_data[etf_data['Date'] <= pd.to_datetime(end_date)]
     
     # Sort by date
-    etf_data = etf_data.sort_values('Date')
+    etf_data = sort_by_date(etf_data)
     
     # Get unique dates
-    unique_dates = sorted(etf_data['Date'].unique())
+    unique_dates = pd.DatetimeIndex(etf_data['Date'].unique()).sort_values()
     
     # Skip cash funds
-    cash_funds = ['XX', 'MVRXX', 'DGCXX', 'FEDXX']
-    etf_data = etf_data[~etf_data['Ticker'].isin(cash_funds)]
+    etf_data = etf_data[~get_cash_mask(etf_data['Ticker'])]
     
-    # Track changes
-    additions_dict = {}
-    removals_dict = {}
-    changes_list = []
+    # Build a dates x tickers presence matrix (dates holding only cash keep an all-zero row)
+    ticker_codes, tickers = pd.factorize(etf_data['Ticker'], use_na_sentinel=False)
+    ticker_names = np.asarray(tickers, dtype=object)
+    presence = np.zeros((len(unique_dates), len(ticker_names)), dtype=np.int8)
+    presence[unique_dates.get_indexer(etf_data['Date']), ticker_codes] = 1
     
-    # Process each date
-    for i, current_date in enumerate(unique_dates):
-        if i == 0:
-            # First date - all positions are considered "new"
-            current_tickers = set(etf_data[etf_data['Date'] == current_date]['Ticker'].unique())
-            for ticker in current_tickers:
-                changes_list.append({
-                    'Date': current_date,
-                    'Action': 'Initial',
-                    'Ticker': ticker
-                })
-        else:
-            # Compare with previous date
-            prev_date = unique_dates[i-1]
-            
-            prev_tickers = set(etf_data[etf_data['Date'] == prev_date]['Ticker'].unique())
-            current_tickers = set(etf_data[etf_data['Date'] == current_date]['Ticker'].unique())
-            
-            # Find additions (in current but not in previous)
-            added_tickers = current_tickers - prev_tickers
-            
-            # Find removals (in previous but not in current)
-            removed_tickers = prev_tickers - current_tickers
-            
-            # Record additions
-            if added_tickers:
-                if current_date not in additions_dict:
-                    additions_dict[current_date] = []
-                for ticker in added_tickers:
-                    additions_dict[current_date].append(ticker)
-                    changes_list.append({
-                        'Date': current_date,
-                        'Action': 'Added',
-                        'Ticker': ticker
-                    })
-            
-            # Record removals
-            if removed_tickers:
-                if current_date not in removals_dict:
-                    removals_dict[current_date] = []
-                for ticker in removed_tickers:
-                    removals_dict[current_date].append(ticker)
-                    changes_list.append({
-                        'Date': current_date,
-                        'Action': 'Removed',
-                        'Ticker': ticker
-                    })
+    # Day-over-day difference: +1 = added (in current but not in previous), -1 = removed
+    diff = np.diff(presence, axis=0)
+    added = diff == 1
+    removed = diff == -1
+    change_dates = unique_dates[1:]
     
     # Create summary DataFrame
-    changes_summary_df = pd.DataFrame(changes_list)
-    
-    # Create additions matrix (dates x tickers)
-    all_added_tickers = set()
-    for tickers in additions_dict.values():
-        all_added_tickers.update(tickers)
-    
-    additions_matrix = pd.DataFrame(index=unique_dates[1:], columns=sorted([str(t) for t in all_added_tickers]))
-    additions_matrix = additions_matrix.fillna(0)
-    
-    for date, tickers in additions_dict.items():
-        for ticker in tickers:
-            if date in additions_matrix.index and ticker in additions_matrix.columns:
-                additions_matrix.loc[date, ticker] = 1
-    
-    # Create removals matrix (dates x tickers)
-    all_removed_tickers = set()
-    for tickers in removals_dict.values():
-        all_removed_tickers.update(tickers)
-    
-    removals_matrix = pd.DataFrame(index=unique_dates[1:], columns=sorted([str(t) for t in all_removed_tickers]))
-    removals_matrix = removals_matrix.fillna(0)
-    
-    for date, tickers in removals_dict.items():
-        for ticker in tickers:
-            if date in removals_matrix.index and ticker in removals_matrix.columns:
-                removals_matrix.loc[date, ticker] = 1
-    
-    # Clean up matrices - keep only rows with changes
-    additions_matrix = additions_matrix[additions_matrix.sum(axis=1) > 0]
-    removals_matrix = removals_matrix[removals_matrix.sum(axis=1) > 0]
+    # First date - all positions are considered "new"
+    initial_cols = np.flatnonzero(presence[0]) if len(unique_dates) > 0 else np.array([], dtype=int)
+    added_rows, added_cols = np.nonzero(added)
+    removed_rows, removed_cols = np.nonzero(removed)
+    
+    changes_summary_df = pd.concat([
+        pd.DataFrame({'Date': unique_dates[:1].repeat(len(initial_cols)), 'Action': 'Initial',
+                      'Ticker': ticker_names[initial_cols]}),
+        pd.DataFrame({'Date': change_dates[added_rows], 'Action': 'Added',
+                      'Ticker': ticker_names[added_cols]}),
+        pd.DataFrame({'Date': change_dates[removed_rows], 'Action': 'Removed',
+                      'Ticker': ticker_names[removed_cols]})
+    ], ignore_index=True)
+    changes_summary_df = changes_summary_df.sort_values('Date', kind='stable', ignore_index=True)
+    
+    # Create additions and removals matrices (dates x tickers)
+    additions_matrix = _build_change_matrix(added, change_dates, ticker_names)
+    removals_matrix = _build_change_matrix(removed, change_dates, ticker_names)
     
     return additions_matrix, removals_matrix, changes_summary_df
 
 
+def _build_change_matrix(flags, dates, ticker_names):
+    """
+    Build a 0/1 dates x tickers DataFrame from a boolean change matrix.
+    Only dates and tickers with at least one change are kept.
+    """
+    rows = flags.any(axis=1)
+    cols = flags.any(axis=0)
+    
+    matrix = pd.DataFrame(
+        flags[np.ix_(rows, cols)].astype(np.int8),
+        index=dates[rows],
+        columns=[str(t) for t in ticker_names[cols]]
+    )
+    return matrix.sort_index(axis=1)
+
+
 def create_portfolio_changes_report(etf_data, etf_name, start_date=None, end_date=None):
     """
     Create a comprehensive portfolio changes report.
@@ -162,19 +125,20 @@ def create_portfolio_changes_report(etf_data, etf_name, start_date=None, end_dat
     # Create daily summary
     daily_summary = []
     
+    # Bucket the changes log by (date, action) once instead of filtering per date
+    tickers_by_action = changes_summary.groupby(['Date', 'Action'], sort=False)['Ticker'].agg(list).to_dict()
+    
     for date in changes_summary['Date'].unique():
-        date_changes = changes_summary[changes_summary['Date'] == date]
-        
-        added = date_changes[date_changes['Action'] == 'Added']['Ticker'].tolist()
-        removed = date_changes[date_changes['Action'] == 'Removed']['Ticker'].tolist()
+        added = tickers_by_action.get((date, 'Added'), [])
+        removed = tickers_by_action.get((date, 'Removed'), [])
         
         if added or removed:
             daily_summary.append({
                 'Date': date,
                 'Additions': len(added),
                 'Removals': len(removed),
-                'Added_Tickers': ', '.join(added) if added else '',
-                'Removed_Tickers': ', '.join(removed) if removed else ''
+                'Added_Tickers': ', '.join(map(str, added)) if added else '',
+                'Removed_Tickers': ', '.join(map(str, removed)) if removed else ''
             })
     
     daily_summary_df = pd.DataFrame(daily_summary)
@@ -188,10 +152,7 @@ def create_portfolio_changes_report(etf_data, etf_name, start_date=None, end_dat
     # Count unique stocks
     all_dates = sorted(changes_summary['Date'].unique())
     if len(all_dates) > 0:
-        first_date_stocks = set(changes_summary[
-            (changes_summary['Date'] == all_dates[0]) & 
-            (changes_summary['Action'] == 'Initial')
-        ]['Ticker'])
+        first_date_stocks = set(tickers_by_action.get((all_dates[0], 'Initial'), []))
         
         total_added = len(changes_summary[changes_summary['Action'] == 'Added'])
         total_removed = len(changes_summary[changes_summary['Action'] == 'Removed'])
@@ -246,7 +207,7 @@ def export_portfolio_changes(etf_name, report_data, output_dir=None):
     filepath = os.path.join(output_dir, filename)
     
     # Export to Excel with multiple sheets
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
+    with pd.ExcelWriter(filepath, engine='xlsxwriter') as writer:
         # Statistics sheet
         if not report_data['statistics'].empty:
             report_data['statistics'].to_excel(
@@ -3,27 +3,82 @@ Visualization script for ETF HHI Analysis results
 """
 
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Headless rendering - plots are only saved to files
 import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+import io
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import partial
 import numpy as np
+from PIL import Image
 
-# Set style
-plt.style.use('seaborn-v0_8-darkgrid')
-sns.set_palette("husl")
+from data_loader import open_excel, read_parquet_cache, write_parquet_cache
 
-def plot_hhi_over_time(df, etf_name, output_dir):
+# Full-color 300 dpi output for publication runs (False = 150 dpi paletted PNGs)
+HQ_PLOTS = False
+
+
+def setup_style():
+    """
+    Apply the plot style (called from main and in each worker process).
+    All plot colors are explicit, so only the matplotlib style sheet is needed.
+    """
+    plt.style.use('seaborn-v0_8-darkgrid')
+    plt.rcParams['path.simplify_threshold'] = 1.0
+
+
+def save_figure(fig, output_file, hq=False):
+    """
+    Save a figure as PNG.
+    
+    By default the figure is rendered at 150 dpi and stored as a 64-color
+    paletted PNG, which is much smaller and faster to encode. Octree
+    quantization keeps every plot and legend color within a few levels of
+    the full-color render. hq=True keeps the full-color 300 dpi output for
+    publication.
+    """
+    if hq:
+        fig.savefig(output_file, dpi=300, bbox_inches='tight')
+        return
+    
+    buf = io.BytesIO()
+    fig.savefig(buf, dpi=150, bbox_inches='tight', format='png')
+    buf.seek(0)
+    with Image.open(buf) as image:
+        # Octree keeps rarely used colors (e.g. the legend-only threshold lines)
+        # that median-cut quantization merges into the background
+        paletted = image.convert('RGB').quantize(colors=64, method=Image.Quantize.FASTOCTREE)
+        paletted.save(output_file, optimize=True)
+
+
+def plot_hhi_over_time(df, etf_name, output_dir, ax=None, hq=False):
     """
     Create line plot for HHI over time
+    
+    Pass ax to draw into an existing (14, 7) figure, which is cleared and
+    reused instead of creating and closing a new one. hq=True saves at
+    full 300 dpi quality (see save_figure).
     """
-    fig, ax = plt.subplots(figsize=(14, 7))
+    own_figure = ax is None
+    if own_figure:
+        fig, ax = plt.subplots(figsize=(14, 7))
+    else:
+        fig = ax.figure
+        ax.cla()
     
-    # Convert Date to datetime
-    df['Date'] = pd.to_datetime(df['Date'])
+    # Convert Date to datetime (main.py writes '%m/%d/%Y' strings; skip if already parsed)
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        try:
+            df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y', cache=True)
+        except ValueError:
+            df['Date'] = df['Date'].astype('datetime64[ns]')
     
     # Plot HHI
-    ax.plot(df['Date'], df['HHI'], linewidth=2, color='navy', alpha=0.8)
+    # (plain arrays skip matplotlib's pandas unit conversion)
+    ax.plot(df['Date'].to_numpy('datetime64[ns]'), df['HHI'].to_numpy(np.float64),
+            linewidth=2, color='navy', alpha=0.8)
     
     # Formatting
     ax.set_xlabel('Date', fontsize=12)
@@ -42,61 +97,64 @@ def plot_hhi_over_time(df, etf_name, output_dir):
     ax.axhline(y=0.25, color='red', linestyle=':', alpha=0.5, label='Highly Concentrated (>0.25)')
     
     # Rotate x-axis labels
-    plt.xticks(rotation=45)
+    ax.tick_params(axis='x', labelrotation=45)
     
     # Add legend
     ax.legend(loc='upper right')
     
     # Add statistics text
-    stats_text = f'Mean: {df["HHI"].mean():.4f}\nMin: {df["HHI"].min():.4f}\nMax: {df["HHI"].max():.4f}'
+    hhi = df['HHI'].dropna().to_numpy(dtype=np.float64)
+    # (NaN for a sheet without rows, as the pandas reductions give)
+    hhi_mean, hhi_min, hhi_max = (hhi.mean(), hhi.min(), hhi.max()) if hhi.size else (np.nan,) * 3
+    stats_text = f'Mean: {hhi_mean:.4f}\nMin: {hhi_min:.4f}\nMax: {hhi_max:.4f}'
     ax.text(0.02, 0.98, stats_text, transform=ax.transAxes, 
             verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
     
-    plt.tight_layout()
-    
-    # Save figure
+    # Save figure (bbox_inches='tight' in save_figure does the layout pass)
     output_file = os.path.join(output_dir, f'{etf_name}_HHI_TimeSeries.png')
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
+    save_figure(fig, output_file, hq=hq)
+    if own_figure:
+        plt.close(fig)
     
     print(f"  ✓ HHI time series plot saved to: {output_file}")
 
 
-def plot_top_contributors_frequency(df, etf_name, output_dir):
+def plot_top_contributors_frequency(df, etf_name, output_dir, ax=None, hq=False):
     """
     Create bar plot for frequency of tickers contributing >50% of daily profits
+    
+    Pass ax to draw into an existing (14, 8) figure, which is cleared and
+    reused instead of creating and closing a new one. hq=True saves at
+    full 300 dpi quality (see save_figure).
     """
-    # Extract all tickers from Top_50pct_Profit_Tickers column
-    all_tickers = []
-    for tickers_str in df['Top_50pct_Profit_Tickers']:
-        if pd.notna(tickers_str) and tickers_str != '':
-            tickers = [t.strip() for t in str(tickers_str).split(',')]
-            all_tickers.extend(tickers)
-    
-    if not all_tickers:
+    # Extract all tickers from Top_50pct_Profit_Tickers column and count frequency
+    all_tickers = df['Top_50pct_Profit_Tickers'].dropna().astype(str).str.split(',').explode().str.strip()
+    ticker_counts = all_tickers[all_tickers != ''].value_counts()
+    
+    if ticker_counts.empty:
         print(f"  ⚠ No top contributor data found for {etf_name}")
         return
     
-    # Count frequency
-    ticker_counts = pd.Series(all_tickers).value_counts()
-    
     # Select top 20 for better visualization
     top_20 = ticker_counts.head(20)
+    top_tickers = top_20.index.to_numpy()
+    top_counts = top_20.to_numpy()
     
     # Create figure
-    fig, ax = plt.subplots(figsize=(14, 8))
-    
-    # Create bar plot
-    bars = ax.bar(range(len(top_20)), top_20.values, color='steelblue', alpha=0.8)
+    own_figure = ax is None
+    if own_figure:
+        fig, ax = plt.subplots(figsize=(14, 8))
+    else:
+        fig = ax.figure
+        ax.cla()
     
-    # Color gradient for bars
-    colors = plt.cm.coolwarm(np.linspace(0.3, 0.7, len(bars)))
-    for bar, color in zip(bars, colors):
-        bar.set_color(color)
+    # Create bar plot with a color gradient
+    colors = plt.cm.coolwarm(np.linspace(0.3, 0.7, len(top_counts)))
+    bars = ax.bar(np.arange(len(top_counts)), top_counts, color=colors, edgecolor=colors, alpha=0.8)
     
     # Set x-axis labels
-    ax.set_xticks(range(len(top_20)))
-    ax.set_xticklabels(top_20.index, rotation=45, ha='right')
+    ax.set_xticks(np.arange(len(top_counts)))
+    ax.set_xticklabels(top_tickers, rotation=45, ha='right')
     
     # Labels and title
     ax.set_xlabel('Stock Ticker', fontsize=12)
@@ -104,7 +162,7 @@ def plot_top_contributors_frequency(df, etf_name, output_dir):
     ax.set_title(f'{etf_name} - Frequency of Top Profit Contributors', fontsize=14, fontweight='bold')
     
     # Add value labels on bars
-    for i, (bar, value) in enumerate(zip(bars, top_20.values)):
+    for i, (bar, value) in enumerate(zip(bars, top_counts)):
         ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5,
                 str(value), ha='center', va='bottom', fontsize=9)
     
@@ -118,16 +176,64 @@ def plot_top_contributors_frequency(df, etf_name, output_dir):
             verticalalignment='top', horizontalalignment='right',
             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
     
-    plt.tight_layout()
-    
-    # Save figure
+    # Save figure (bbox_inches='tight' in save_figure does the layout pass)
     output_file = os.path.join(output_dir, f'{etf_name}_Top_Contributors_Frequency.png')
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
+    save_figure(fig, output_file, hq=hq)
+    if own_figure:
+        plt.close(fig)
     
     print(f"  ✓ Top contributors frequency plot saved to: {output_file}")
 
 
+def load_hhi_sheets(excel_path):
+    """
+    Load every <ETF>_Daily_HHI_Analysis sheet from the combined workbook.
+    
+    The parsed sheets are cached as Parquet next to the workbook and reused
+    while the cache is newer than the workbook.
+    
+    Returns:
+    --------
+    dict
+        Sheet name -> DataFrame, in workbook order
+    """
+    cache_path = excel_path + '.daily_hhi.parquet'
+    
+    cached = read_parquet_cache(excel_path, cache_path)
+    # Sheet is categorical with every sheet name (in workbook order) as a category,
+    # so sheets without rows come back as empty groups
+    if cached is not None and isinstance(cached.dtypes.get('Sheet'), pd.CategoricalDtype):
+        return {sheet_name: df.drop(columns='Sheet').reset_index(drop=True)
+                for sheet_name, df in cached.groupby('Sheet', observed=False)}
+    
+    with open_excel(excel_path) as workbook:
+        hhi_sheets = [name for name in workbook.sheet_names if name.endswith('_Daily_HHI_Analysis')]
+        all_sheets = pd.read_excel(workbook, sheet_name=hhi_sheets)
+    
+    # Empty sheets are left out of the rows (they would upcast every column to object)
+    frames = [df.assign(Sheet=sheet_name) for sheet_name, df in all_sheets.items() if len(df)]
+    if frames:
+        combined = pd.concat(frames, ignore_index=True)
+        combined['Sheet'] = pd.Categorical(combined['Sheet'], categories=hhi_sheets)
+        write_parquet_cache(combined, cache_path)
+    
+    return all_sheets
+
+
+def _process_one(sheet, output_dir, ax_hhi=None, ax_top=None, hq=False):
+    """
+    Generate both plots for one (sheet name, DataFrame) pair from load_hhi_sheets.
+    hq is passed on to save_figure.
+    """
+    sheet_name, df = sheet
+    etf_name = sheet_name.split('_')[0]
+    print(f"\nProcessing {etf_name}...")
+    
+    # Generate plots
+    plot_hhi_over_time(df, etf_name, output_dir, ax=ax_hhi, hq=hq)
+    plot_top_contributors_frequency(df, etf_name, output_dir, ax=ax_top, hq=hq)
+
+
 def main():
     """
     Main function to generate visualizations for all ETFs
@@ -138,27 +244,35 @@ def main():
     # Setup paths
     output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
     
-    # Get all Excel files from today
+    # Get today's combined analysis workbook
     today_str = datetime.now().strftime("%Y%m%d")
-    excel_files = [f for f in os.listdir(output_dir) 
-                   if f.endswith(f'_{today_str}.xlsx') and not f.startswith('~$')]
+    excel_path = os.path.join(output_dir, f'All_ETFs_Analysis_{today_str}.xlsx')
     
-    if not excel_files:
-        print("❌ No analysis files found from today. Please run main.py first.")
+    if not os.path.exists(excel_path):
+        print("❌ No analysis file found from today. Please run main.py first.")
         return
     
-    # Process each ETF
-    for excel_file in excel_files:
-        etf_name = excel_file.split('_')[0]
-        print(f"\nProcessing {etf_name}...")
+    # Process each ETF (one <ETF>_Daily_HHI_Analysis sheet per ETF)
+    all_sheets = load_hhi_sheets(excel_path)
+    
+    setup_style()
+    max_workers = min(len(all_sheets), os.cpu_count() or 1)
+    
+    if len(all_sheets) > 2 and max_workers > 1:
+        # ETFs are independent, so plot them in parallel processes
+        # (not worth the process start-up for one or two ETFs)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=setup_style) as executor:
+            list(executor.map(partial(_process_one, output_dir=output_dir, hq=HQ_PLOTS), all_sheets.items()))
+    else:
+        # Create the figures once and redraw them for each ETF
+        fig_hhi, ax_hhi = plt.subplots(figsize=(14, 7))
+        fig_top, ax_top = plt.subplots(figsize=(14, 8))
         
-        # Read Excel file
-        excel_path = os.path.join(output_dir, excel_file)
-        df = pd.read_excel(excel_path, sheet_name='Daily_HHI_Analysis')
+        for sheet in all_sheets.items():
+            _process_one(sheet, output_dir, ax_hhi=ax_hhi, ax_top=ax_top, hq=HQ_PLOTS)
         
-        # Generate plots
-        plot_hhi_over_time(df, etf_name, output_dir)
-        plot_top_contributors_frequency(df, etf_name, output_dir)
+        plt.close(fig_hhi)
+        plt.close(fig_top)
     
     print("\n" + "=" * 60)
     print("✅ All visualizations complete!")
@@ -6,6 +6,8 @@ Tracks daily weight changes and decomposes them into position and price componen
 import pandas as pd
 import numpy as np
 
+from data_loader import get_cash_mask, njit, sort_by_date
+
 
 def calculate_weight_changes(etf_data, start_date=None, end_date=None):
     """
@@ -24,6 +26,7 @@ def calculate_weight_changes(etf_data, start_date=None, end_date=None):
     --------
     pd.DataFrame
         DataFrame with weight change analysis for each stock on each date
+        (Date is kept as datetime64; format it when exporting)
     """
     # Filter by date range if specified
     if start_date:
@@ -32,110 +35,133 @@ def calculate_weight_changes(etf_data, start_date=None, end_date=None):
         etf_data = etf_data[etf_data['Date'] <= pd.to_datetime(end_date)]
     
     # Sort by date
-    etf_data = etf_data.sort_values('Date')
+    etf_data = sort_by_date(etf_data)
     
     # Get unique dates
-    unique_dates = sorted(etf_data['Date'].unique())
+    unique_dates = pd.DatetimeIndex(etf_data['Date'].unique()).sort_values()
     
     # Skip cash funds
-    cash_funds = ['XX', 'MVRXX', 'DGCXX', 'FEDXX']
-    etf_data = etf_data[~etf_data['Ticker'].isin(cash_funds)]
+    etf_data = etf_data[~get_cash_mask(etf_data['Ticker'])]
     
-    results = []
+    # Total market value per date (denominator), taken from the first holding row
+    # Use ETF Market Value which is the total portfolio value
+    market_value = (
+        etf_data.drop_duplicates('Date')
+        .set_index('Date')['ETF Market Value']
+        .reindex(unique_dates, fill_value=0)
+        .to_numpy(dtype=np.float64, copy=True)
+    )
     
-    # Process each date pair
-    for i in range(1, len(unique_dates)):
-        current_date = unique_dates[i]
-        prev_date = unique_dates[i-1]
-        
-        # Get holdings for both dates
-        prev_holdings = etf_data[etf_data['Date'] == prev_date]
-        current_holdings = etf_data[etf_data['Date'] == current_date]
-        
-        # Calculate total market value for previous date (for denominator)
-        # Use ETF Market Value which is the total portfolio value
-        prev_total_market_value = prev_holdings['ETF Market Value'].iloc[0] if len(prev_holdings) > 0 else 0
+    # Lay out Date x Ticker matrices against one global ticker index
+    # (first row of each ticker on each date)
+    holdings = etf_data[etf_data['Ticker'].notna()].drop_duplicates(['Date', 'Ticker'])
+    ticker_index = pd.Index(holdings['Ticker'].unique())
+    date_rows = unique_dates.get_indexer(holdings['Date'])
+    ticker_cols = ticker_index.get_indexer(holdings['Ticker'])
+    shape = (len(unique_dates), len(ticker_index))
+    
+    # Tickers not held on a date count as zero; a held ticker with a missing price stays NaN
+    present = np.zeros(shape, dtype=bool)
+    present[date_rows, ticker_cols] = True
+    # Weights are float32 like the loaded data; share counts can exceed float32's
+    # 2^24 exact range and prices are reported as-is, so those stay float64
+    weight = np.zeros(shape, dtype=np.float32)
+    weight[date_rows, ticker_cols] = holdings['Weight'].to_numpy(dtype=np.float32)
+    position = np.zeros(shape)
+    position[date_rows, ticker_cols] = holdings['Position'].to_numpy(dtype=np.float64)
+    price = np.zeros(shape)
+    price[date_rows, ticker_cols] = holdings['Stock_Price'].to_numpy(dtype=np.float64)
+    
+    prev_weight, current_weight = weight[:-1], weight[1:]
+    prev_position, current_position = position[:-1], position[1:]
+    prev_price, current_price = price[:-1], price[1:]
+    
+    # Decompose weight change
+    weight_change, weight_change_from_position, weight_change_from_price, residual = _decompose(
+        prev_weight, current_weight, prev_position, current_position,
+        prev_price, current_price, market_value[:-1]
+    )
+    
+    # Only include if there's meaningful data
+    rows, cols = np.nonzero((prev_weight > 0) | (current_weight > 0))
+    
+    # Company name from the previous date, falling back to the current date
+    if 'Company_Name' in holdings.columns:
+        names = np.full(shape, '', dtype=object)
+        names[date_rows, ticker_cols] = holdings['Company_Name'].to_numpy(dtype=object)
+        prev_name, current_name = names[:-1][rows, cols], names[1:][rows, cols]
+        prev_held, current_held = present[:-1][rows, cols], present[1:][rows, cols]
+        company_name = np.where(prev_held & prev_name.astype(bool), prev_name,
+                                np.where(current_held, current_name, prev_name))
+    else:
+        company_name = np.full(len(rows), '', dtype=object)
+    
+    # Gather the included (date, ticker) cells straight into output columns
+    tickers = np.asarray(ticker_index, dtype=object)
+    change_dates = unique_dates[1:]
+    prev_price_rows = prev_price[rows, cols]
+    current_price_rows = current_price[rows, cols]
+    
+    return pd.DataFrame({
+        'Date': change_dates[rows],
+        'Ticker': tickers[cols],
+        'Company_Name': company_name,
+        'Prev_Weight': prev_weight[rows, cols].astype(np.float64),
+        'Current_Weight': current_weight[rows, cols].astype(np.float64),
+        'Weight_Change': weight_change[rows, cols].astype(np.float64),
+        'Prev_Position': prev_position[rows, cols],
+        'Current_Position': current_position[rows, cols],
+        'Position_Change': current_position[rows, cols] - prev_position[rows, cols],
+        'Prev_Price': prev_price_rows,
+        'Current_Price': current_price_rows,
+        'Price_Change': np.where(prev_price_rows > 0, current_price_rows - prev_price_rows, 0),
+        'Weight_Change_from_Position': weight_change_from_position[rows, cols],
+        'Weight_Change_from_Price': weight_change_from_price[rows, cols],
+        'Residual': residual[rows, cols]
+    })
+
+
+@njit('Tuple((f4[:, ::1], f8[:, ::1], f8[:, ::1], f8[:, ::1]))'
+      '(f4[:, ::1], f4[:, ::1], f8[:, ::1], f8[:, ::1], f8[:, ::1], f8[:, ::1], f8[::1])',
+      cache=True, fastmath={'nsz', 'arcp', 'contract', 'afn'})
+def _decompose(prev_weight, current_weight, prev_position, current_position,
+               prev_price, current_price, prev_market_value):
+    """
+    Decompose day-over-day weight changes into position and price components.
+    
+    All matrices are (date pairs x tickers), with float32 weights and float64
+    positions/prices; prev_market_value holds the previous date's total
+    market value for each row.
+    
+    Returns:
+    --------
+    tuple of np.ndarray
+        weight_change, weight_change_from_position, weight_change_from_price, residual
+    """
+    weight_change = current_weight - prev_weight  # Note: positive means weight increased
+    from_position = np.zeros(weight_change.shape)
+    from_price = np.zeros(weight_change.shape)
+    
+    # Days without a positive previous market value keep zero components
+    valid = np.nonzero(prev_market_value > 0)[0]
+    if valid.size > 0:
+        market_value = prev_market_value[valid].reshape(-1, 1)
+        valid_prev_position = prev_position[valid]
+        valid_prev_price = prev_price[valid]
+        position_change = current_position[valid] - valid_prev_position  # Note: positive means position increased
+        price_change = current_price[valid] - valid_prev_price
         
-        # Get all unique tickers from both dates
-        all_tickers = set(prev_holdings['Ticker'].unique()) | set(current_holdings['Ticker'].unique())
+        # Weight change due to position change (active rebalancing)
+        from_position[valid] = np.where(valid_prev_price > 0,
+                                        (position_change * valid_prev_price) / market_value, 0.0)
         
-        for ticker in all_tickers:
-            # Skip if ticker is NaN or cash fund
-            if pd.isna(ticker) or (isinstance(ticker, str) and ticker in cash_funds):
-                continue
-            
-            # Get data for this ticker on both dates
-            prev_ticker_data = prev_holdings[prev_holdings['Ticker'] == ticker]
-            current_ticker_data = current_holdings[current_holdings['Ticker'] == ticker]
-            
-            # Initialize values
-            prev_weight = 0
-            prev_position = 0
-            prev_price = 0
-            current_weight = 0
-            current_position = 0
-            current_price = 0
-            company_name = ''
-            
-            # Get previous date values
-            if len(prev_ticker_data) > 0:
-                prev_row = prev_ticker_data.iloc[0]
-                prev_weight = prev_row['Weight']
-                prev_position = prev_row['Position']
-                prev_price = prev_row['Stock_Price']
-                if 'Company_Name' in prev_row:
-                    company_name = prev_row['Company_Name']
-            
-            # Get current date values
-            if len(current_ticker_data) > 0:
-                current_row = current_ticker_data.iloc[0]
-                current_weight = current_row['Weight']
-                current_position = current_row['Position']
-                current_price = current_row['Stock_Price']
-                if 'Company_Name' in current_row and not company_name:
-                    company_name = current_row['Company_Name']
-            
-            # Calculate changes
-            weight_change = current_weight - prev_weight  # Note: positive means weight increased
-            position_change = current_position - prev_position  # Note: positive means position increased
-            
-            # Decompose weight change
-            # Weight change due to position change (active rebalancing)
-            if prev_total_market_value > 0 and prev_price > 0:
-                # Position increase contributes positively to weight
-                weight_change_from_position = (position_change * prev_price) / prev_total_market_value
-            else:
-                weight_change_from_position = 0
-            
-            # Weight change due to price change
-            if prev_total_market_value > 0 and prev_position > 0:
-                # Price increase contributes positively to weight
-                price_change = current_price - prev_price
-                weight_change_from_price = (price_change * prev_position) / prev_total_market_value
-            else:
-                weight_change_from_price = 0
-            
-            # Only include if there's meaningful data
-            if prev_weight > 0 or current_weight > 0:
-                results.append({
-                    'Date': current_date.strftime('%m/%d/%Y'),
-                    'Ticker': ticker,
-                    'Company_Name': company_name,
-                    'Prev_Weight': prev_weight,
-                    'Current_Weight': current_weight,
-                    'Weight_Change': weight_change,
-                    'Prev_Position': prev_position,
-                    'Current_Position': current_position,
-                    'Position_Change': position_change,
-                    'Prev_Price': prev_price,
-                    'Current_Price': current_price,
-                    'Price_Change': current_price - prev_price if prev_price > 0 else 0,
-                    'Weight_Change_from_Position': weight_change_from_position,
-                    'Weight_Change_from_Price': weight_change_from_price,
-                    'Residual': weight_change - weight_change_from_position - weight_change_from_price
-                })
-    
-    return pd.DataFrame(results)
+        # Weight change due to price change
+        from_price[valid] = np.where(valid_prev_position > 0,
+                                     (price_change * valid_prev_position) / market_value, 0.0)
+    
+    residual = weight_change - from_position - from_price
+    
+    return weight_change, from_position, from_price, residual
 
 
 def create_daily_weight_change_summary(weight_changes_df):
@@ -155,30 +181,35 @@ def create_daily_weight_change_summary(weight_changes_df):
     if weight_changes_df.empty:
         return pd.DataFrame()
     
-    daily_summary = []
+    df = weight_changes_df
     
-    for date in weight_changes_df['Date'].unique():
-        date_data = weight_changes_df[weight_changes_df['Date'] == date]
-        
-        # Get stocks with significant changes
-        significant_weight_increases = date_data[date_data['Weight_Change'] > 0.001].nlargest(3, 'Weight_Change')
-        significant_weight_decreases = date_data[date_data['Weight_Change'] < -0.001].nsmallest(3, 'Weight_Change')
-        
-        # Calculate aggregates
-        total_position_impact = date_data['Weight_Change_from_Position'].abs().sum()
-        total_price_impact = date_data['Weight_Change_from_Price'].abs().sum()
-        
-        daily_summary.append({
-            'Date': date,
-            'Stocks_with_Changes': len(date_data[date_data['Weight_Change'].abs() > 0.0001]),
-            'Total_Position_Impact': total_position_impact,
-            'Total_Price_Impact': total_price_impact,
-            'Top_Weight_Increases': ', '.join([f"{row['Ticker']} (+{row['Weight_Change']:.4f})" 
-                                              for _, row in significant_weight_increases.iterrows()]),
-            'Top_Weight_Decreases': ', '.join([f"{row['Ticker']} ({row['Weight_Change']:.4f})" 
-                                              for _, row in significant_weight_decreases.iterrows()]),
-            'Stocks_Added': len(date_data[date_data['Prev_Weight'] == 0]),
-            'Stocks_Removed': len(date_data[date_data['Current_Weight'] == 0])
-        })
-    
-    return pd.DataFrame(daily_summary)
\ No newline at end of file
+    # Per-row flags and impacts, summed per date in one groupby
+    daily_summary = pd.DataFrame({
+        'Date': df['Date'],
+        'Stocks_with_Changes': df['Weight_Change'].abs() > 0.0001,
+        'Total_Position_Impact': df['Weight_Change_from_Position'].abs(),
+        'Total_Price_Impact': df['Weight_Change_from_Price'].abs(),
+        'Stocks_Added': df['Prev_Weight'] == 0,
+        'Stocks_Removed': df['Current_Weight'] == 0
+    }).groupby('Date', sort=False).sum()
+    
+    # Get stocks with significant changes
+    daily_summary['Top_Weight_Increases'] = _top_weight_changes(df[df['Weight_Change'] > 0.001], ascending=False, sign='+')
+    daily_summary['Top_Weight_Decreases'] = _top_weight_changes(df[df['Weight_Change'] < -0.001], ascending=True, sign='')
+    daily_summary[['Top_Weight_Increases', 'Top_Weight_Decreases']] = (
+        daily_summary[['Top_Weight_Increases', 'Top_Weight_Decreases']].fillna('')
+    )
+    
+    return daily_summary.reset_index()[[
+        'Date', 'Stocks_with_Changes', 'Total_Position_Impact', 'Total_Price_Impact',
+        'Top_Weight_Increases', 'Top_Weight_Decreases', 'Stocks_Added', 'Stocks_Removed'
+    ]]
+
+
+def _top_weight_changes(changes, ascending, sign):
+    """
+    Format the 3 largest (or smallest) weight changes per date as "TICKER (+0.0123), ...".
+    """
+    top = changes.sort_values('Weight_Change', ascending=ascending, kind='stable').groupby('Date', sort=False).head(3)
+    labels = top['Ticker'].astype(str) + f' ({sign}' + top['Weight_Change'].map('{:.4f}'.format) + ')'
+    return labels.groupby(top['Date'], sort=False).agg(', '.join)
@@ -0,0 +1,65 @@
+"""
+Tests for the combined-workbook analysis run in main.py.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+import main
+
+
+def _fake_holdings(etf_name):
+    """
+    Three days of holdings; the ETF name shifts prices so each ETF differs.
+    """
+    offset = float(len(etf_name) + ord(etf_name[-1]) % 7)
+    return pd.DataFrame({
+        'Date': pd.to_datetime(['2024-05-01'] * 3 + ['2024-05-02'] * 3 + ['2024-05-03'] * 2),
+        'Ticker': pd.Categorical(['AAA', 'BBB', 'XX', 'AAA', 'BBB', 'CCC', 'AAA', 'CCC']),
+        'Bloomberg Name': pd.Categorical(['AAA US', 'BBB US', 'XX', 'AAA US', 'BBB US', 'CCC US', 'AAA US', 'CCC US']),
+        'Position': [100.0, 30.0, 1.0, 120.0, 30.0, 10.0, 120.0, 15.0],
+        'Stock_Price': np.array([10.0, 20.0, 1.0, 11.0, 19.0, 8.0, 12.0, 9.0]) + offset,
+        'Weight': np.array([0.5, 0.3, 0.2, 0.6, 0.3, 0.1, 0.8, 0.2], dtype=np.float32),
+        'ETF Market Value': [2000.0] * 3 + [2100.0] * 3 + [2200.0] * 2,
+        'Company_Name': np.nan
+    })
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_run_analyses_writes_all_etfs_in_order(tmp_path, monkeypatch, max_workers):
+    monkeypatch.setattr(main, 'load_etf_holdings', _fake_holdings)
+    output_file = str(tmp_path / 'All_ETFs_Analysis.xlsx')
+    
+    main.run_analyses(['ETFA', 'ETFB'], '2024-01-01', '2024-12-31', output_file, max_workers=max_workers)
+    
+    with pd.ExcelFile(output_file) as workbook:
+        assert workbook.sheet_names == [
+            'ETFA_Daily_HHI_Analysis', 'ETFA_Portfolio_Changes', 'ETFA_Weight_Changes',
+            'ETFB_Daily_HHI_Analysis', 'ETFB_Portfolio_Changes', 'ETFB_Weight_Changes'
+        ]
+        hhi = pd.read_excel(workbook, sheet_name='ETFA_Daily_HHI_Analysis')
+        weight_changes = pd.read_excel(workbook, sheet_name='ETFB_Weight_Changes')
+    
+    assert hhi['Date'].tolist() == ['05/01/2024', '05/02/2024', '05/03/2024']
+    assert hhi['Holdings_Count'].tolist() == [2, 3, 2]
+    assert weight_changes['Date'].iloc[0] == '05/02/2024'
+
+
+def test_run_analyses_single_and_multi_process_match(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'load_etf_holdings', _fake_holdings)
+    
+    workbooks = {}
+    for max_workers in (1, 2):
+        output_file = str(tmp_path / f'All_ETFs_Analysis_{max_workers}.xlsx')
+        main.run_analyses(['ETFA', 'ETFB'], '2024-01-01', '2024-12-31', output_file, max_workers=max_workers)
+        workbooks[max_workers] = pd.read_excel(output_file, sheet_name=None)
+    
+    assert workbooks[1].keys() == workbooks[2].keys()
+    for sheet_name in workbooks[1]:
+        pd.testing.assert_frame_equal(workbooks[1][sheet_name], workbooks[2][sheet_name])
@@ -0,0 +1,50 @@
+"""
+Regression tests for portfolio change tracking with missing tickers.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+from main import analyze_etf
+from portfolio_changes import create_portfolio_changes_report
+
+
+def _holdings_with_nan_ticker():
+    """
+    Two dates where a holding with a missing ticker is held on the first
+    date only (removed), and one with a new ticker appears on the second.
+    """
+    return pd.DataFrame({
+        'Date': pd.to_datetime(['2024-05-01'] * 3 + ['2024-05-02'] * 3),
+        'Ticker': pd.Categorical(['AAA', np.nan, 'BBB', 'AAA', 'BBB', 'CCC']),
+        'Bloomberg Name': pd.Categorical(['AAA US', 'NAN US', 'BBB US', 'AAA US', 'BBB US', 'CCC US']),
+        'Position': [100.0, 50.0, 30.0, 100.0, 30.0, 10.0],
+        'Stock_Price': [10.0, 5.0, 20.0, 11.0, 20.0, 8.0],
+        'Weight': np.array([0.5, 0.2, 0.3, 0.5, 0.3, 0.2], dtype=np.float32),
+        'ETF Market Value': [2000.0] * 3 + [2000.0] * 3,
+        'Company_Name': np.nan
+    })
+
+
+def test_analyze_etf_labels_removed_nan_ticker():
+    sheets = analyze_etf('TEST', '2024-01-01', '2024-12-31', etf_data=_holdings_with_nan_ticker())
+    
+    changes = sheets['Portfolio_Changes']
+    assert changes['Date'].tolist() == ['05/02/2024']
+    assert changes['Stocks_Added'].tolist() == ['CCC']
+    assert changes['Stocks_Removed'].tolist() == ['nan']
+    assert changes['Stocks_Removed_Count'].tolist() == [1]
+
+
+def test_portfolio_changes_report_labels_nan_ticker():
+    report = create_portfolio_changes_report(_holdings_with_nan_ticker(), 'TEST')
+    
+    daily = report['daily_summary']
+    assert daily['Added_Tickers'].tolist() == ['CCC']
+    assert daily['Removed_Tickers'].tolist() == ['nan']
+    assert report['statistics']['Initial_Holdings'].tolist() == [3]